@@ -0,0 +1,24 @@
+# Gunicorn settings for the production image.
+#
+# The availability stream (GET /api/availability/stream) keeps one long-lived
+# response open per browser. Sync workers would be pinned by each of those, so
+# workers are gevent-based: an idle stream is a parked greenlet waiting on its
+# subscription, and thousands of them fit in a handful of processes.
+import os
+
+bind = "0.0.0.0:8000"
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+worker_class = "gevent"
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 2000))
+timeout = 60
+# Recycling a worker drops every stream open on it, so it is off by default.
+# Clients reconnect after the `retry` delay but miss updates in between.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 0))
+
+
+def post_fork(server, worker):
+    # psycopg2 is a C extension that blocks the gevent hub during queries
+    # unless it is told to cooperate with the event loop.
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
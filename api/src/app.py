@@ -3,6 +3,10 @@ from flask_cors import CORS
 from .config import Config
 from .models import db, create_tables
 from .routes import api_bp
+from .availability import init_availability
+from .importer import import_history_command
+from .querycount import init_query_counter
+from .logging_config import init_logging
 import os
 
 
@@ -21,11 +25,14 @@ def create_app(config_class=None) -> Flask:
     CORS(app,
          origins=allowed_origins,
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-         allow_headers=['Content-Type', 'Authorization'],
+         allow_headers=['Content-Type', 'Authorization', 'X-Request-ID'],
+         # Correlation ID and the QUERY_COUNT_HEADER debug headers
+         expose_headers=['X-Request-ID', 'X-Query-Count', 'X-Query-Time-Ms'],
          supports_credentials=True)
 
 
     app.config.from_object(config_class or Config)
+    init_logging(app)
 
     if app.config.get('SQLALCHEMY_DATABASE_URI'):
         db.init_app(app)
@@ -40,6 +47,10 @@ def create_app(config_class=None) -> Flask:
         db.init_app(app)
         app.register_blueprint(api_bp, url_prefix='/api')
 
+    init_availability(app)
+    init_query_counter(app)
+    app.cli.add_command(import_history_command)
+
     return app
 
 
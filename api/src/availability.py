@@ -0,0 +1,208 @@
+import json
+import logging
+import re
+import select
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Set
+from flask import Flask
+from .models import db, Reservation, TOTAL_TABLES
+
+
+CHANNEL_NAME_PATTERN = re.compile(r'^[a-z_][a-z0-9_]*$')
+# How often the listener wakes up to check whether it should stop
+LISTEN_POLL_SECONDS: float = 1.0
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A single stream client. Changes are coalesced into a dict keyed by time
+    slot, so a slow client holds at most one pending value per slot.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[str, int] = {}
+        self._condition = threading.Condition()
+
+    def push(self, time_slot: str, free_tables: int) -> None:
+        with self._condition:
+            self._pending[time_slot] = free_tables
+            self._condition.notify()
+
+    def wait(self, timeout: float) -> Dict[str, int]:
+        """
+        Blocks until there are pending changes or the timeout expires, then
+        returns and clears them.
+        """
+        with self._condition:
+            if not self._pending:
+                self._condition.wait(timeout)
+            changes, self._pending = self._pending, {}
+        return changes
+
+
+class AvailabilityBroadcaster:
+    """
+    In-process publisher fanning out per-slot free table counts to all
+    subscribed stream clients.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self.notify_channel: Optional[str] = None
+        self.listener: Optional[threading.Thread] = None
+        self.stop_listening: threading.Event = threading.Event()
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, time_slot: str, free_tables: int) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(time_slot, free_tables)
+
+
+broadcaster: AvailabilityBroadcaster = AvailabilityBroadcaster()
+
+
+def count_free_tables(time_slot: datetime) -> int:
+    """
+    Counts the tables still free for a time slot (an index-only count on
+    _time_slot_table_uc).
+    """
+    booked = Reservation.query.filter_by(time_slot=time_slot,
+                                         cancelled_at=None).count()
+    return max(TOTAL_TABLES - booked, 0)
+
+
+def announce_slot(time_slot: datetime) -> None:
+    """
+    Publishes the current free table count for a time slot. Must be called
+    after the change has been committed. With a notify channel configured
+    the update goes through Postgres so every worker receives it; otherwise
+    it is published to this process only.
+    """
+    free_tables = count_free_tables(time_slot)
+    slot = time_slot.isoformat()
+
+    if broadcaster.notify_channel:
+        payload = json.dumps({"timeSlot": slot, "freeTables": free_tables})
+        db.session.execute(db.select(db.func.pg_notify(
+            broadcaster.notify_channel, payload)))
+        db.session.commit()
+    else:
+        broadcaster.publish(slot, free_tables)
+
+
+def format_event(changes: Dict[str, int]) -> str:
+    """Formats coalesced changes as a Server-Sent Event."""
+    slots = [{"timeSlot": slot, "freeTables": free}
+             for slot, free in sorted(changes.items())]
+    return f"event: availability\ndata: {json.dumps({'slots': slots})}\n\n"
+
+
+def stream_availability(coalesce_seconds: float,
+                        heartbeat_seconds: float) -> Iterator[str]:
+    """
+    Subscribes to the broadcaster and yields Server-Sent Events until the
+    client disconnects. After each event the stream sleeps for the
+    coalescing interval, so a burst of bookings sends at most one update per
+    slot per interval. The generator never touches the database, so idle
+    clients do not hold pooled connections.
+    """
+    subscription = broadcaster.subscribe()
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            changes = subscription.wait(heartbeat_seconds)
+            if not changes:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(changes)
+            if coalesce_seconds:
+                time.sleep(coalesce_seconds)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+def _listen_forever(app: Flask, channel: str, stop: threading.Event) -> None:
+    """
+    Relays Postgres NOTIFY payloads on `channel` to the local broadcaster,
+    reconnecting after failures, until `stop` is set.
+    """
+    while not stop.is_set():
+        raw_connection = None
+        try:
+            with app.app_context():
+                raw_connection = db.engine.raw_connection()
+            connection = raw_connection.driver_connection
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {channel}")
+
+            while not stop.is_set():
+                if select.select([connection], [], [],
+                                 LISTEN_POLL_SECONDS) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notification = connection.notifies.pop(0)
+                    change = json.loads(notification.payload)
+                    broadcaster.publish(change["timeSlot"],
+                                        change["freeTables"])
+        except Exception:
+            logger.exception("Availability listener error, reconnecting")
+            stop.wait(5)
+        finally:
+            # Never return a LISTENing connection to the pool
+            if raw_connection is not None:
+                raw_connection.invalidate()
+
+
+def stop_availability() -> None:
+    """
+    Stops the cross-worker listener, if one is running, and goes back to
+    publishing in-process only.
+    """
+    broadcaster.notify_channel = None
+    listener, broadcaster.listener = broadcaster.listener, None
+    if listener is not None:
+        broadcaster.stop_listening.set()
+        listener.join()
+
+
+def init_availability(app: Flask) -> None:
+    """
+    Configures the broadcaster and, when AVAILABILITY_NOTIFY_CHANNEL is set
+    on a PostgreSQL database, starts the cross-worker listener thread.
+    """
+    stop_availability()
+    channel = app.config.get('AVAILABILITY_NOTIFY_CHANNEL')
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if not channel or not uri.startswith('postgresql'):
+        return
+
+    if not CHANNEL_NAME_PATTERN.match(channel):
+        raise ValueError(f"Invalid AVAILABILITY_NOTIFY_CHANNEL: {channel}")
+
+    broadcaster.notify_channel = channel
+    broadcaster.stop_listening = threading.Event()
+    broadcaster.listener = threading.Thread(
+        target=_listen_forever, args=(app, channel, broadcaster.stop_listening),
+        name='availability-listener', daemon=True)
+    broadcaster.listener.start()
@@ -5,9 +5,25 @@ from typing import Optional
 class Config:
     SQLALCHEMY_DATABASE_URI: Optional[str] = os.environ.get('DB_CONN_STR')
     SQLALCHEMY_TRACK_MODIFICATIONS: bool = False
+    # Postgres LISTEN/NOTIFY channel relaying availability across workers
+    AVAILABILITY_NOTIFY_CHANNEL: Optional[str] = os.environ.get(
+        'AVAILABILITY_NOTIFY_CHANNEL')
+    AVAILABILITY_COALESCE_SECONDS: float = float(os.environ.get(
+        'AVAILABILITY_COALESCE_SECONDS', 1.0))
+    AVAILABILITY_HEARTBEAT_SECONDS: float = float(os.environ.get(
+        'AVAILABILITY_HEARTBEAT_SECONDS', 15.0))
+    # Debug aid: report per-request query count and DB time in headers
+    QUERY_COUNT_HEADER: bool = os.environ.get('QUERY_COUNT_HEADER') == '1'
+    # One structured log record per request; successes are sampled
+    LOG_REQUESTS: bool = os.environ.get('LOG_REQUESTS', '1') == '1'
+    LOG_SUCCESS_SAMPLE_RATE: float = float(os.environ.get(
+        'LOG_SUCCESS_SAMPLE_RATE', 1.0))
 
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    AVAILABILITY_NOTIFY_CHANNEL = None
+    AVAILABILITY_COALESCE_SECONDS = 0.0
+    AVAILABILITY_HEARTBEAT_SECONDS = 0.1
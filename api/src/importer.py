@@ -0,0 +1,332 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, IO, Iterator, List, Optional, Set, Tuple
+import click
+from flask.cli import with_appcontext
+from .models import db, Customer, Reservation, TOTAL_TABLES
+
+
+CONFLICT_SAMPLE_SIZE: int = 20
+
+SlotKey = Tuple[datetime, int]
+
+
+class ImportReport:
+    """
+    Running totals for one input file. Only a bounded sample of conflicts
+    is kept in memory; the full list is streamed to --conflicts-out.
+    """
+
+    def __init__(self, kind: str, conflicts_out: Optional[IO[str]]) -> None:
+        self.kind = kind
+        self.rows = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.conflicts = 0
+        self.conflict_sample: List[Dict[str, Any]] = []
+        self._conflicts_out = conflicts_out
+        self._started = time.perf_counter()
+
+    def conflict(self, line: int, reason: str, **details: Any) -> None:
+        self.conflicts += 1
+        record = {"file": self.kind, "line": line, "reason": reason, **details}
+        if self._conflicts_out:
+            self._conflicts_out.write(json.dumps(record, default=str) + "\n")
+        if len(self.conflict_sample) < CONFLICT_SAMPLE_SIZE:
+            self.conflict_sample.append(record)
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self._started
+        rate = self.rows / elapsed if elapsed else float(self.rows)
+        return (f"{self.kind}: {self.rows} rows read, {self.inserted} inserted, "
+                f"{self.duplicates} duplicates skipped, {self.conflicts} "
+                f"conflicts in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+
+
+def iter_records(path: str,
+                 report: ImportReport) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Lazily yields (line number, record) pairs from a CSV file with a header
+    row, or from an NDJSON file with one object per line. NDJSON lines that
+    are not a JSON object are counted and reported as invalid rows.
+    """
+    with open(path, newline='', encoding='utf-8') as handle:
+        if path.lower().endswith('.csv'):
+            reader = csv.DictReader(handle)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    report.rows += 1
+                    report.conflict(line_number, f"invalid row: {e}")
+                    continue
+                if not isinstance(record, dict):
+                    report.rows += 1
+                    report.conflict(line_number,
+                                    "invalid row: expected a JSON object")
+                    continue
+                yield line_number, record
+
+
+def iter_batches(records: Iterator[Tuple[int, Dict[str, Any]]],
+                 batch_size: int) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 't', 'yes', 'y')
+
+
+def parse_text(record: Dict[str, Any], column: Any) -> Optional[str]:
+    """
+    Returns the stripped value of `column` in `record`, or None when it is
+    missing or blank. Raises ValueError for values that are not strings or
+    do not fit the column, which PostgreSQL would otherwise reject for the
+    whole batch.
+    """
+    value = record.get(column.key)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{column.key} must be a string")
+    value = value.strip()
+    max_length = column.type.length
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{column.key} is longer than {max_length} "
+                         "characters")
+    return value or None
+
+
+def parse_time_slot(value: Any) -> datetime:
+    # time_slot is a timestamp without time zone, which discards offsets on
+    # PostgreSQL; drop them here too so keys compare equal after insert.
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    return parsed.replace(tzinfo=None)
+
+
+def is_postgres() -> bool:
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def copy_rows(table: str, columns: List[str], rows: List[List[Any]]) -> None:
+    """Streams rows into a PostgreSQL table with COPY ... FROM STDIN."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer)
+    finally:
+        cursor.close()
+
+
+def write_customers(rows: List[Dict[str, Any]]) -> int:
+    """
+    Inserts customers whose email address is not yet taken and returns the
+    number inserted. Rows must already be unique by email address.
+    """
+    if is_postgres():
+        db.session.execute(db.text(
+            "CREATE TEMP TABLE IF NOT EXISTS import_customers ("
+            "customer_name text, email_address text, phone_number text, "
+            "newsletter_signup boolean) ON COMMIT DELETE ROWS"))
+        copy_rows('import_customers',
+                  ['customer_name', 'email_address', 'phone_number',
+                   'newsletter_signup'],
+                  [[row['customer_name'], row['email_address'],
+                    row['phone_number'], 't' if row['newsletter_signup'] else 'f']
+                   for row in rows])
+        result = db.session.execute(db.text(
+            "INSERT INTO customers (customer_name, email_address, "
+            "phone_number, newsletter_signup) "
+            "SELECT customer_name, email_address, phone_number, "
+            "newsletter_signup FROM import_customers "
+            "ON CONFLICT (email_address) DO NOTHING"))
+        return result.rowcount
+
+    emails = [row['email_address'] for row in rows]
+    existing = set(db.session.scalars(
+        db.select(Customer.email_address)
+        .where(Customer.email_address.in_(emails))))
+    new_rows = [row for row in rows if row['email_address'] not in existing]
+    if new_rows:
+        db.session.execute(db.insert(Customer.__table__), new_rows)
+    return len(new_rows)
+
+
+def write_reservations(rows: List[Dict[str, Any]]) -> Set[SlotKey]:
+    """
+    Inserts reservations that do not collide on _time_slot_table_uc and
+    returns the (time_slot, table_number) keys actually inserted. Rows must
+    already be unique by that key.
+    """
+    if is_postgres():
+        db.session.execute(db.text(
+            "CREATE TEMP TABLE IF NOT EXISTS import_reservations ("
+            "customer_id integer, time_slot timestamp, table_number integer) "
+            "ON COMMIT DELETE ROWS"))
+        copy_rows('import_reservations',
+                  ['customer_id', 'time_slot', 'table_number'],
+                  [[row['customer_id'], row['time_slot'].isoformat(),
+                    row['table_number']] for row in rows])
+        result = db.session.execute(db.text(
+            "INSERT INTO reservations (customer_id, time_slot, table_number) "
+            "SELECT customer_id, time_slot, table_number "
+            "FROM import_reservations "
+            "ON CONFLICT (time_slot, table_number) "
+            "WHERE cancelled_at IS NULL DO NOTHING "
+            "RETURNING time_slot, table_number"))
+        return {(time_slot, table_number)
+                for time_slot, table_number in result}
+
+    slots = {row['time_slot'] for row in rows}
+    existing = set(db.session.execute(
+        db.select(Reservation.time_slot, Reservation.table_number)
+        .where(Reservation.time_slot.in_(list(slots)),
+               Reservation.cancelled_at.is_(None))).tuples().all())
+    new_rows = [row for row in rows
+                if (row['time_slot'], row['table_number']) not in existing]
+    if new_rows:
+        db.session.execute(db.insert(Reservation.__table__), new_rows)
+    return {(row['time_slot'], row['table_number']) for row in new_rows}
+
+
+def import_customers(path: str, batch_size: int,
+                     report: ImportReport) -> None:
+    """
+    Loads customers, deduplicating by email address both within the file
+    (first occurrence wins) and against existing rows.
+    """
+    for batch in iter_batches(iter_records(path, report), batch_size):
+        report.rows += len(batch)
+        rows: Dict[str, Dict[str, Any]] = {}
+        for line, record in batch:
+            try:
+                email = parse_text(record, Customer.email_address)
+                name = parse_text(record, Customer.customer_name)
+                phone = parse_text(record, Customer.phone_number)
+            except ValueError as e:
+                report.conflict(line, f"invalid row: {e}")
+                continue
+            if not email or not name:
+                report.conflict(line, "missing customer_name or email_address")
+                continue
+            if email in rows:
+                report.duplicates += 1
+                continue
+            rows[email] = {
+                "customer_name": name,
+                "email_address": email,
+                "phone_number": phone,
+                "newsletter_signup": parse_bool(record.get('newsletter_signup'))
+            }
+
+        inserted = write_customers(list(rows.values())) if rows else 0
+        db.session.commit()
+        report.inserted += inserted
+        report.duplicates += len(rows) - inserted
+
+
+def import_reservations(path: str, batch_size: int,
+                        report: ImportReport) -> None:
+    """
+    Loads reservations, resolving customer_id from email_address with one
+    query per batch. Rows for unknown customers, tables outside
+    1..TOTAL_TABLES or already booked (time_slot, table_number) pairs are
+    reported as conflicts.
+    """
+    for batch in iter_batches(iter_records(path, report), batch_size):
+        report.rows += len(batch)
+        parsed: List[Tuple[int, str, SlotKey]] = []
+        for line, record in batch:
+            try:
+                email = parse_text(record, Customer.email_address) or ''
+                key = (parse_time_slot(record['time_slot']),
+                       int(record['table_number']))
+                if not 1 <= key[1] <= TOTAL_TABLES:
+                    raise ValueError(f"table_number {key[1]} is not between "
+                                     f"1 and {TOTAL_TABLES}")
+            except (KeyError, TypeError, ValueError) as e:
+                report.conflict(line, f"invalid row: {e}")
+                continue
+            parsed.append((line, email, key))
+
+        emails = {email for _, email, _ in parsed}
+        customer_ids = dict(db.session.execute(
+            db.select(Customer.email_address, Customer.customer_id)
+            .where(Customer.email_address.in_(list(emails)))).tuples().all())
+
+        rows: Dict[SlotKey, Dict[str, Any]] = {}
+        lines: Dict[SlotKey, int] = {}
+        for line, email, key in parsed:
+            if email not in customer_ids:
+                report.conflict(line, "unknown customer", email_address=email)
+                continue
+            if key in rows:
+                report.conflict(line, "_time_slot_table_uc",
+                                time_slot=key[0], table_number=key[1])
+                continue
+            lines[key] = line
+            rows[key] = {"customer_id": customer_ids[email],
+                         "time_slot": key[0], "table_number": key[1]}
+
+        inserted = write_reservations(list(rows.values())) if rows else set()
+        db.session.commit()
+        report.inserted += len(inserted)
+        for key in rows.keys() - inserted:
+            report.conflict(lines[key], "_time_slot_table_uc",
+                            time_slot=key[0], table_number=key[1])
+
+
+@click.command('import-history')
+@click.option('--customers', 'customers_path',
+              type=click.Path(exists=True, dir_okay=False),
+              help='CSV or NDJSON file of customers.')
+@click.option('--reservations', 'reservations_path',
+              type=click.Path(exists=True, dir_okay=False),
+              help='CSV or NDJSON file of reservations keyed by email_address.')
+@click.option('--batch-size', default=5000, show_default=True,
+              type=click.IntRange(min=1), help='Rows per transaction.')
+@click.option('--conflicts-out', type=click.File('w'),
+              help='Write every conflict to this file as NDJSON.')
+@with_appcontext
+def import_history_command(customers_path: Optional[str],
+                           reservations_path: Optional[str],
+                           batch_size: int,
+                           conflicts_out: Optional[IO[str]]) -> None:
+    """Bulk import historical customers and reservations."""
+    if not customers_path and not reservations_path:
+        raise click.UsageError(
+            "Pass --customers and/or --reservations to import.")
+
+    jobs = [('customers', customers_path, import_customers),
+            ('reservations', reservations_path, import_reservations)]
+    for kind, path, load in jobs:
+        if not path:
+            continue
+        report = ImportReport(kind, conflicts_out)
+        load(path, batch_size, report)
+        click.echo(report.summary())
+        for record in report.conflict_sample:
+            click.echo(f"  conflict: {json.dumps(record, default=str)}",
+                       err=True)
+        if report.conflicts > len(report.conflict_sample):
+            click.echo(f"  ... {report.conflicts - len(report.conflict_sample)}"
+                       " more conflicts", err=True)
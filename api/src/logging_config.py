@@ -0,0 +1,213 @@
+import atexit
+import copy
+import importlib
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+from flask import (Flask, Response, current_app, g, has_request_context,
+                   request)
+from .querycount import QueryCounter
+
+
+# Loggers of every module in this package are children of this one
+PACKAGE_LOGGER: str = __name__.rsplit('.', 1)[0]
+
+# Request context fields copied onto log records when present
+CONTEXT_FIELDS = ('request_id', 'method', 'route', 'path', 'status',
+                  'latency_ms', 'db_time_ms', 'db_queries')
+
+# Longer client-supplied X-Request-ID values are truncated
+REQUEST_ID_MAX_LENGTH: int = 128
+
+_listener: Optional[QueueListener] = None
+request_logger = logging.getLogger(f"{PACKAGE_LOGGER}.requests")
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(
+                record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Stamps records with the current request's ID and route. Runs on the
+    request thread, before the record is handed to the queue.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if has_request_context():
+            if getattr(record, 'request_id', None) is None:
+                record.request_id = g.get('request_id')
+            if getattr(record, 'route', None) is None and request.url_rule:
+                record.route = request.url_rule.rule
+        return True
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler that renders the traceback into exc_text instead of the
+    message, so the JSON formatter on the listener thread can emit it as a
+    separate field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _original(module: str, name: str) -> Any:
+    """
+    Returns `module.name` as it was before gevent monkey-patching, or as it
+    is now when gevent is not installed or has not patched it.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return getattr(importlib.import_module(module), name)
+    return monkey.get_original(module, name)
+
+
+class NativeThreadQueueListener(QueueListener):
+    """
+    QueueListener whose worker is an OS thread even under gunicorn's gevent
+    workers. There, threading.Thread would start a greenlet, which only
+    drains the queue when the hub is idle and blocks every request while it
+    writes to stdout.
+    """
+
+    def start(self) -> None:
+        finished = _original('_thread', 'allocate_lock')()
+        finished.acquire()
+
+        def run() -> None:
+            try:
+                self._monitor()
+            finally:
+                finished.release()
+
+        self._thread = finished
+        _original('_thread', 'start_new_thread')(run, ())
+
+    def stop(self) -> None:
+        """Processes every queued record, then ends the worker thread."""
+        if self._thread is not None:
+            self.enqueue_sentinel()
+            self._thread.acquire()
+            self._thread = None
+
+
+def start_structured_logging(stream: Any = None) -> None:
+    """
+    Routes this package's loggers through a queue to a background OS thread
+    that writes JSON lines, so request threads and greenlets never block on
+    I/O. Idempotent: the listener is shared by every app in the process.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    # The queue, the worker thread and the output lock must all be native:
+    # gevent's versions can only be waited on from the hub's own thread.
+    log_queue: queue.SimpleQueue = _original('queue', 'SimpleQueue')()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.lock = _original('_thread', 'RLock')()
+    output.setFormatter(JsonFormatter())
+
+    handler = StructuredQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    package_logger = logging.getLogger(PACKAGE_LOGGER)
+    package_logger.addHandler(handler)
+    package_logger.setLevel(logging.INFO)
+    package_logger.propagate = False
+
+    _listener = NativeThreadQueueListener(log_queue, output,
+                                          respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _start_request_log() -> None:
+    request_id = request.headers.get('X-Request-ID', '')
+    g.request_id = request_id[:REQUEST_ID_MAX_LENGTH] or uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+    g.request_queries = QueryCounter().start()
+
+
+def _finish_request_log(response: Response) -> Response:
+    queries = g.pop('request_queries', None)
+    started = g.pop('request_started', None)
+    if queries is None or started is None:
+        return response
+    queries.stop()
+    response.headers['X-Request-ID'] = g.request_id
+
+    # Errors are always logged; successes are sampled
+    is_error = response.status_code >= 400
+    sample_rate = current_app.config.get('LOG_SUCCESS_SAMPLE_RATE', 1.0)
+    if not is_error and random.random() >= sample_rate:
+        return response
+
+    request_logger.log(
+        logging.WARNING if response.status_code >= 500 else logging.INFO,
+        "request completed",
+        extra={
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+            "db_time_ms": round(queries.duration * 1000, 3),
+            "db_queries": queries.count,
+        })
+    return response
+
+
+def _stop_request_log(exc: Optional[BaseException]) -> None:
+    queries = g.pop('request_queries', None)
+    if queries is not None:
+        queries.stop()
+
+
+def init_logging(app: Flask) -> None:
+    """
+    Starts structured JSON logging and, when LOG_REQUESTS is enabled, logs
+    one record per request with its ID, route, latency and DB time.
+    Successful requests are sampled at LOG_SUCCESS_SAMPLE_RATE.
+    """
+    start_structured_logging()
+    if not app.config.get('LOG_REQUESTS', True):
+        return
+
+    app.before_request(_start_request_log)
+    app.after_request(_finish_request_log)
+    app.teardown_request(_stop_request_log)
@@ -1,9 +1,31 @@
 from flask_sqlalchemy import SQLAlchemy
 from os import environ
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import logging
+import sqlite3
 
 
 db: SQLAlchemy = SQLAlchemy()
 TOTAL_TABLES: int = int(environ.get("TOTAL_TABLES", 30))
+logger = logging.getLogger(__name__)
+
+
+def _unicode_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record) -> None:
+    """
+    SQLite's built-in lower() only folds ASCII. Replace it with Python's
+    str.lower() so lower(customer_name) agrees with prefixes lowered in
+    Python, e.g. "É" and "é". It must stay deterministic to be usable in
+    the expression index.
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('lower', 1, _unicode_lower,
+                                         deterministic=True)
 
 
 class Customer(db.Model):
@@ -17,6 +39,16 @@ class Customer(db.Model):
     reservations = db.relationship('Reservation', backref='customer',
                                    lazy=True)
 
+    # Case-insensitive prefix lookups ("Smith's booking tonight") are
+    # answered by a scan on lower(customer_name). On PostgreSQL the index
+    # uses text_pattern_ops, which compares bytewise whatever the database
+    # collation, so it can serve a left-anchored LIKE.
+    __table_args__ = (db.Index('ix_customers_customer_name_lower',
+                               db.func.lower(customer_name)
+                               .label('customer_name_lower'),
+                               postgresql_ops={
+                                   'customer_name_lower': 'text_pattern_ops'}),)
+
     def __repr__(self) -> str:
         return f"<Customer {self.customer_name} ({self.email_address})>"
 
@@ -32,9 +64,22 @@ class Reservation(db.Model):
                             nullable=False)
     time_slot = db.Column(db.DateTime, nullable=False)
     table_number = db.Column(db.Integer, nullable=False)
+    # Set when the booking is cancelled; cancelled rows are kept for history
+    cancelled_at = db.Column(db.DateTime, nullable=True)
+
+    # _time_slot_table_uc only covers active bookings, so a cancelled row
+    # never blocks its table. It leads with time_slot, so it also serves
+    # time_slot range scans that filter on cancelled_at IS NULL;
+    # customer_id needs its own index for the customer join.
+    __table_args__ = (db.Index('_time_slot_table_uc', 'time_slot',
+                               'table_number', unique=True,
+                               postgresql_where=cancelled_at.is_(None),
+                               sqlite_where=cancelled_at.is_(None)),
+                      db.Index('ix_reservations_customer_id', 'customer_id'),)
 
-    __table_args__ = (db.UniqueConstraint('time_slot', 'table_number',
-                                          name='_time_slot_table_uc'),)
+    @property
+    def is_cancelled(self) -> bool:
+        return self.cancelled_at is not None
 
     def __repr__(self) -> str:
         return (f"<Reservation {self.reservation_id} - "
@@ -50,13 +95,13 @@ def create_tables() -> None:
         # Mask credentials in the connection string for logging
         creds_part = db_url.split('@')[0].split('//')[1]
         masked_url = db_url.replace(creds_part, '***:***')
-        print(f"Attempting to connect to database: {masked_url}")
+        logger.info("Attempting to connect to database: %s", masked_url)
 
         # Create tables using the app context
         # PostgreSQL service should handle database creation
         db.create_all()
-        print("Database tables created successfully!")
-    except Exception as e:
-        print(f"Error creating tables: {e}")
+        logger.info("Database tables created successfully!")
+    except Exception:
+        logger.exception("Error creating tables")
         # Don't raise the exception - let the app continue running
         # Tables will be created on first successful connection
@@ -0,0 +1,150 @@
+import time
+from contextvars import ContextVar
+from typing import Any, List, Optional, Tuple
+from flask import Flask, Response, g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+_active_counters: ContextVar[Tuple['QueryCounter', ...]] = ContextVar(
+    'active_query_counters', default=())
+_listeners_installed: bool = False
+
+# Transaction control is not counted: drivers normally issue BEGIN and
+# COMMIT outside cursor execution, and the savepoints the test suite wraps
+# around each test would otherwise inflate every budget.
+TRANSACTION_CONTROL: Tuple[str, ...] = ('BEGIN', 'SAVEPOINT', 'RELEASE',
+                                        'ROLLBACK')
+
+
+class QueryCounter:
+    """
+    Counts SQL statements and their total execution time while active.
+
+    Usable as a context manager. Counting is scoped to the current context
+    (thread or greenlet), so concurrent requests do not see each other's
+    statements.
+    """
+
+    def __init__(self) -> None:
+        self.statements: List[str] = []
+        self.duration: float = 0.0
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.statements.append(statement)
+        self.duration += elapsed
+
+    def start(self) -> 'QueryCounter':
+        install_listeners()
+        _active_counters.set(_active_counters.get() + (self,))
+        return self
+
+    def stop(self) -> None:
+        _active_counters.set(tuple(counter for counter in _active_counters.get()
+                                   if counter is not self))
+
+    def __enter__(self) -> 'QueryCounter':
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def assert_within(self, max_statements: int,
+                      max_duration: Optional[float] = None) -> None:
+        """
+        Raises AssertionError, listing the statements issued, if the budget
+        of statements or total seconds spent in the database was exceeded.
+        """
+        listing = '\n'.join(f"  {statement}" for statement in self.statements)
+        assert self.count <= max_statements, (
+            f"Expected at most {max_statements} statements, "
+            f"got {self.count}:\n{listing}")
+        if max_duration is not None:
+            assert self.duration <= max_duration, (
+                f"Expected at most {max_duration:.3f}s in the database, "
+                f"took {self.duration:.3f}s:\n{listing}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany) -> None:
+    # Kept on the execution context, not the connection, so a statement
+    # that raises cannot leave a stale start time on a pooled connection
+    if _active_counters.get() and context is not None:
+        context._query_start_time = time.perf_counter()
+
+
+def _record_statement(statement: str, context: Any) -> None:
+    counters = _active_counters.get()
+    started = getattr(context, '_query_start_time', None)
+    if not counters or started is None:
+        return
+    context._query_start_time = None
+    elapsed = time.perf_counter() - started
+    if statement.lstrip().upper().startswith(TRANSACTION_CONTROL):
+        return
+    for counter in counters:
+        counter.record(statement, elapsed)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany) -> None:
+    _record_statement(statement, context)
+
+
+def _handle_error(exception_context) -> None:
+    # Failed statements, such as the IntegrityError behind a booking retry,
+    # still cost a round trip and count towards the budget
+    if exception_context.execution_context is not None:
+        _record_statement(exception_context.statement,
+                          exception_context.execution_context)
+
+
+def install_listeners() -> None:
+    """
+    Registers the cursor execution and error hooks on every engine, once.
+    The hooks return immediately when no counter is active.
+    """
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    _listeners_installed = True
+
+
+def _start_request_counter() -> None:
+    g.query_counter = QueryCounter().start()
+
+
+def _add_query_headers(response: Response) -> Response:
+    counter = g.pop('query_counter', None)
+    if counter is not None:
+        counter.stop()
+        response.headers['X-Query-Count'] = str(counter.count)
+        response.headers['X-Query-Time-Ms'] = f"{counter.duration * 1000:.2f}"
+    return response
+
+
+def _stop_request_counter(exc: Optional[BaseException]) -> None:
+    counter = g.pop('query_counter', None)
+    if counter is not None:
+        counter.stop()
+
+
+def init_query_counter(app: Flask) -> None:
+    """
+    When QUERY_COUNT_HEADER is enabled, reports the statements issued and
+    the time spent in the database for each request in the X-Query-Count
+    and X-Query-Time-Ms response headers.
+    """
+    if not app.config.get('QUERY_COUNT_HEADER'):
+        return
+
+    app.before_request(_start_request_counter)
+    app.after_request(_add_query_headers)
+    app.teardown_request(_stop_request_counter)
@@ -1,9 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
 from datetime import datetime
+import logging
 import re
 import random
 from typing import Optional, Set, Tuple, Dict, Any
-from models import db, Customer, Reservation, TOTAL_TABLES
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Query
+from .models import db, Customer, Reservation, TOTAL_TABLES
+from .availability import announce_slot, stream_availability
+
+
+# Retries when a concurrent booking takes the chosen table first
+MAX_TABLE_ASSIGNMENT_ATTEMPTS: int = 3
+SEARCH_DEFAULT_PER_PAGE: int = 20
+SEARCH_MAX_PER_PAGE: int = 100
+
+logger = logging.getLogger(__name__)
 
 
 def is_valid_email(email: str) -> bool:
@@ -44,7 +56,7 @@ def get_booked_tables_for_slot(time_slot: datetime) -> Set[int]:
     (FR-8 and FR-18 - retrieving currently booked tables for a time slot)
     """
     booked_reservations = Reservation.query.filter_by(
-        time_slot=time_slot).all()
+        time_slot=time_slot, cancelled_at=None).all()
     booked_tables = {res.table_number for res in booked_reservations}
     return booked_tables
 
@@ -63,6 +75,94 @@ def find_available_table_number(booked_tables: Set[int]) -> Optional[int]:
     return random.choice(available_tables)
 
 
+def announce_slots(*time_slots: datetime) -> None:
+    """
+    Pushes the new free table counts for committed changes to availability
+    stream clients. A missed live update must not fail the request.
+    """
+    for time_slot in set(time_slots):
+        try:
+            announce_slot(time_slot)
+        except Exception:
+            db.session.rollback()
+            logger.exception("Error announcing availability")
+
+
+def next_code_point(char: str) -> Optional[str]:
+    """
+    Returns the character sorting directly after `char` by code point,
+    skipping the surrogate block, or None when `char` is the last one.
+    """
+    code = ord(char) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000
+    return chr(code) if code <= 0x10FFFF else None
+
+
+def build_reservation_search_query(email_address: Optional[str] = None,
+                                   name_prefix: Optional[str] = None,
+                                   start: Optional[datetime] = None,
+                                   end: Optional[datetime] = None) -> Query:
+    """
+    Builds the Reservation -> Customer join used by the search endpoint.
+    Every filter maps onto an index: the unique email index, the
+    lower(customer_name) expression index and _time_slot_table_uc. At least
+    one filter is required, since an unfiltered search scans the table.
+    """
+    if not (email_address or name_prefix or start or end):
+        raise ValueError("At least one search filter is required.")
+
+    query = db.session.query(Reservation, Customer).join(
+        Customer, Reservation.customer_id == Customer.customer_id)
+
+    if email_address:
+        query = query.filter(Customer.email_address == email_address)
+
+    # Only active bookings; this also lets _time_slot_table_uc, a partial
+    # index, serve time_slot ranges
+    query = query.filter(Reservation.cancelled_at.is_(None))
+
+    if name_prefix:
+        prefix = name_prefix.lower()
+        lowered_name = db.func.lower(Customer.customer_name)
+        escaped = (prefix.replace('\\', '\\\\')
+                   .replace('%', '\\%').replace('_', '\\_'))
+        query = query.filter(lowered_name.like(f"{escaped}%", escape='\\'))
+        if db.session.get_bind().dialect.name != 'postgresql':
+            # SQLite never uses an index for LIKE on an expression, so add
+            # the prefix as a half-open range too. Its BINARY collation
+            # orders by code point, which keeps the range exact. PostgreSQL
+            # answers the LIKE from the text_pattern_ops index instead,
+            # where a range would follow the database collation.
+            successor = next_code_point(prefix[-1])
+            if successor:
+                query = query.filter(lowered_name >= prefix,
+                                     lowered_name < prefix[:-1] + successor)
+
+    if start:
+        query = query.filter(Reservation.time_slot >= start)
+
+    if end:
+        query = query.filter(Reservation.time_slot < end)
+
+    return query.order_by(Reservation.time_slot, Reservation.reservation_id)
+
+
+def serialize_reservation(res: Reservation,
+                          customer: Optional[Customer]) -> Dict[str, Any]:
+    """
+    Builds the JSON representation of a reservation and its customer.
+    """
+    return {
+        "reservationId": res.reservation_id,
+        "customerName": customer.customer_name if customer else None,
+        "emailAddress": customer.email_address if customer else None,
+        "timeSlot": res.time_slot.isoformat(),
+        "tableNumber": res.table_number,
+        "cancelled": res.is_cancelled
+    }
+
+
 api_bp = Blueprint('api', __name__)
 
 @api_bp.route('/health', methods=['GET'])
@@ -108,11 +208,30 @@ def handle_reservation() -> Tuple[Dict[str, Any], int]:
     # Get or create customer (FR-17)
     customer = get_or_create_customer(customer_name, email_address, phone_number, newsletter_signup)
 
-    # Check existing bookings for the time slot (FR-8, FR-18)
-    booked_tables = get_booked_tables_for_slot(time_slot)
+    for _ in range(MAX_TABLE_ASSIGNMENT_ATTEMPTS):
+        # Check existing bookings for the time slot (FR-8, FR-18)
+        booked_tables = get_booked_tables_for_slot(time_slot)
+
+        # Find an available table (FR-8, FR-18)
+        assigned_table_number = find_available_table_number(booked_tables)
 
-    # Find an available table (FR-8, FR-18)
-    assigned_table_number = find_available_table_number(booked_tables)
+        if assigned_table_number is None:
+            break
+
+        # Insert the new reservation (FR-17)
+        new_reservation = Reservation(
+            customer_id=customer.customer_id,
+            time_slot=time_slot,
+            table_number=assigned_table_number
+        )
+        db.session.add(new_reservation)
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            # Another booking took this table after we read the slot
+            db.session.rollback()
+            assigned_table_number = None
 
     if assigned_table_number is None:
         # All seats are taken for that time slot (FR-9, FR-18)
@@ -122,14 +241,7 @@ def handle_reservation() -> Tuple[Dict[str, Any], int]:
             "success": False
         }), 409 # Conflict
 
-    # Insert the new reservation (FR-17)
-    new_reservation = Reservation(
-        customer_id=customer.customer_id,
-        time_slot=time_slot,
-        table_number=assigned_table_number
-    )
-    db.session.add(new_reservation)
-    db.session.commit()
+    announce_slots(time_slot)
 
     # Display a success message on booking (FR-9)
     return jsonify({
@@ -190,7 +302,7 @@ def newsletter_signup() -> Tuple[Dict[str, Any], int]:
 
     except Exception as e:
         db.session.rollback() 
-        print(f"Error during newsletter signup: {e}")
+        logger.exception("Error during newsletter signup")
 
         if "duplicate key value violates unique constraint" in str(e):
              return jsonify({"message": "This email is already subscribed to our newsletter."}), 409
@@ -202,20 +314,13 @@ def get_reservations() -> Tuple[Dict[str, Any], int]:
     Retrieves all reservations.
     """
     try:
-        reservations = Reservation.query.all()
-        result = []
-        for res in reservations:
-            customer = Customer.query.get(res.customer_id)
-            result.append({
-                "reservationId": res.reservation_id,
-                "customerName": customer.customer_name if customer else None,
-                "emailAddress": customer.email_address if customer else None,
-                "timeSlot": res.time_slot.isoformat(),
-                "tableNumber": res.table_number
-            })
+        rows = db.session.query(Reservation, Customer).outerjoin(
+            Customer, Reservation.customer_id == Customer.customer_id).all()
+        result = [serialize_reservation(res, customer)
+                  for res, customer in rows]
         return jsonify({"reservations": result}), 200
-    except Exception as e:
-        print(f"Error fetching reservations: {e}")
+    except Exception:
+        logger.exception("Error fetching reservations")
         return jsonify({"message": "An error occurred while fetching reservations."}), 500
 
 @api_bp.route('/reservations/<int:reservation_id>', methods=['GET'])
@@ -224,18 +329,141 @@ def get_reservation_by_id(reservation_id: int) -> Tuple[Dict[str, Any], int]:
     Retrieves a reservation by its ID.
     """
     try:
-        res = Reservation.query.get(reservation_id)
-        if not res:
+        row = db.session.query(Reservation, Customer).outerjoin(
+            Customer, Reservation.customer_id == Customer.customer_id).filter(
+            Reservation.reservation_id == reservation_id).first()
+        if not row:
             return jsonify({"message": "Reservation not found."}), 404
-        customer = Customer.query.get(res.customer_id)
-        reservation_data = {
-            "reservationId": res.reservation_id,
-            "customerName": customer.customer_name if customer else None,
-            "emailAddress": customer.email_address if customer else None,
-            "timeSlot": res.time_slot.isoformat(),
-            "tableNumber": res.table_number
-        }
+        reservation_data = serialize_reservation(*row)
         return jsonify(reservation_data), 200
-    except Exception as e:
-        print(f"Error fetching reservation: {e}")
+    except Exception:
+        logger.exception("Error fetching reservation")
         return jsonify({"message": "An error occurred while fetching the reservation."}), 500
+
+@api_bp.route('/reservations/<int:reservation_id>', methods=['PUT'])
+def modify_reservation(reservation_id: int) -> Tuple[Dict[str, Any], int]:
+    """
+    Moves a reservation to another time slot, reassigning its table with an
+    in-place UPDATE in a single transaction.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({"message": "Invalid JSON data"}), 400
+
+    time_slot_str = data.get('timeSlot')
+    if not time_slot_str:
+        return jsonify({"message": "Missing required field (time slot)."}), 400
+
+    try:
+        time_slot = datetime.fromisoformat(time_slot_str.replace('Z', '+00:00'))
+    except ValueError:
+        return jsonify({"message": "Invalid time slot format. Please use ISO format (e.g., YYYY-MM-DDTHH:MM:SSZ)."}), 400
+
+    for _ in range(MAX_TABLE_ASSIGNMENT_ATTEMPTS):
+        # Lock the row so a concurrent cancellation waits for the move
+        res = Reservation.query.filter_by(
+            reservation_id=reservation_id).with_for_update().first()
+        if not res or res.is_cancelled:
+            db.session.rollback()
+            return jsonify({"message": "Reservation not found."}), 404
+
+        previous_time_slot = res.time_slot
+        if previous_time_slot == time_slot:
+            db.session.rollback()
+            return jsonify(serialize_reservation(res, res.customer)), 200
+
+        table_number = find_available_table_number(
+            get_booked_tables_for_slot(time_slot))
+        if table_number is None:
+            break
+
+        res.time_slot = time_slot
+        res.table_number = table_number
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another booking took this table after we read the slot
+            db.session.rollback()
+            continue
+
+        announce_slots(previous_time_slot, time_slot)
+        return jsonify(serialize_reservation(res, res.customer)), 200
+
+    db.session.rollback()
+    return jsonify({
+        "message": "Sorry, all tables are booked for this time slot. Please pick another time.",
+        "success": False
+    }), 409
+
+@api_bp.route('/reservations/<int:reservation_id>', methods=['DELETE'])
+def cancel_reservation(reservation_id: int) -> Tuple[Dict[str, Any], int]:
+    """
+    Cancels a reservation. The row is kept with cancelled_at set, which
+    frees its table for new bookings.
+    """
+    res = Reservation.query.filter_by(
+        reservation_id=reservation_id).with_for_update().first()
+    if not res:
+        db.session.rollback()
+        return jsonify({"message": "Reservation not found."}), 404
+
+    if not res.is_cancelled:
+        res.cancelled_at = datetime.now()
+        db.session.commit()
+        announce_slots(res.time_slot)
+
+    return jsonify({"message": "Reservation cancelled.", "success": True}), 200
+
+@api_bp.route('/reservations/search', methods=['GET'])
+def search_reservations() -> Tuple[Dict[str, Any], int]:
+    """
+    Searches reservations by customer email (exact), customer name prefix
+    and a time slot range [from, to). Results are paginated.
+    """
+    email_address = request.args.get('email')
+    name_prefix = request.args.get('name')
+
+    try:
+        start_str = request.args.get('from')
+        end_str = request.args.get('to')
+        start = datetime.fromisoformat(start_str.replace('Z', '+00:00')) if start_str else None
+        end = datetime.fromisoformat(end_str.replace('Z', '+00:00')) if end_str else None
+    except ValueError:
+        return jsonify({"message": "Invalid time range format. Please use ISO format (e.g., YYYY-MM-DDTHH:MM:SSZ)."}), 400
+
+    if not (email_address or name_prefix or start or end):
+        return jsonify({"message": "Pass at least one of email, name, from or to. Use /api/reservations to list every reservation."}), 400
+
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('perPage', SEARCH_DEFAULT_PER_PAGE, type=int)
+    if page < 1 or per_page < 1:
+        return jsonify({"message": "page and perPage must be positive integers."}), 400
+    per_page = min(per_page, SEARCH_MAX_PER_PAGE)
+
+    query = build_reservation_search_query(email_address, name_prefix,
+                                           start, end)
+    # Fetch one extra row to learn whether another page exists without
+    # issuing a separate COUNT query.
+    rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+
+    return jsonify({
+        "reservations": [serialize_reservation(res, customer)
+                         for res, customer in rows[:per_page]],
+        "page": page,
+        "perPage": per_page,
+        "hasMore": len(rows) > per_page
+    }), 200
+
+@api_bp.route('/availability/stream', methods=['GET'])
+def availability_stream() -> Response:
+    """
+    Server-Sent Events feed of per-slot free table counts, pushed whenever
+    a reservation change commits.
+    """
+    stream = stream_availability(
+        current_app.config.get('AVAILABILITY_COALESCE_SECONDS', 1.0),
+        current_app.config.get('AVAILABILITY_HEARTBEAT_SECONDS', 15.0))
+    return Response(stream, mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Stop reverse proxies buffering events
+    })
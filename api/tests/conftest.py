@@ -1,35 +1,150 @@
 import pytest
-import tempfile
 import os
 import sys
+from sqlalchemy import event, orm
 
 # Add the parent directory to the path so we can import our modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # pylint: disable=wrong-import-position
 from src.app import create_app
+from src.availability import stop_availability
 from src.models import db
 from src.config import TestingConfig
+from src.querycount import QueryCounter
+
+
+# TEST_DATABASE_URL points the suite at another database (e.g. a local
+# PostgreSQL) so dialect-specific paths are exercised. Each pytest-xdist
+# worker gets its own database, suffixed with the worker id.
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+# "transaction" builds the schema once per session and rolls every test
+# back; "schema" recreates all tables around every test.
+TEST_ISOLATION = os.environ.get('TEST_ISOLATION', 'transaction')
+
+
+def worker_database_url(suffix=''):
+    """Return a fresh database URL private to this worker."""
+    if not TEST_DATABASE_URL:
+        # In-memory SQLite is private to the process, hence to the worker
+        return TestingConfig.SQLALCHEMY_DATABASE_URI
+
+    from sqlalchemy.engine import make_url
+    from sqlalchemy_utils import create_database, database_exists, drop_database
+
+    worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+    url = make_url(TEST_DATABASE_URL)
+    url = url.set(database=f"{url.database}_{worker}{suffix}")
+    if database_exists(url):
+        drop_database(url)
+    create_database(url)
+    return url.render_as_string(hide_password=False)
+
+
+def drop_worker_database(url):
+    """Drop a database created by worker_database_url, if any."""
+    if not TEST_DATABASE_URL:
+        return
+
+    from sqlalchemy_utils import database_exists, drop_database
+
+    if database_exists(url):
+        drop_database(url)
+
+
+def enable_sqlite_savepoints(engine):
+    """
+    Let SQLAlchemy, not pysqlite, emit BEGIN so SAVEPOINTs work inside the
+    per-test transaction.
+    """
+    @event.listens_for(engine, 'connect')
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def do_begin(connection):
+        connection.exec_driver_sql('BEGIN')
+
+
+@pytest.fixture(scope='session')
+def session_app():
+    """Create the app and its schema once per test session."""
+    database_url = worker_database_url()
+    config = type('SessionTestingConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': database_url})
+    app = create_app(config)
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            enable_sqlite_savepoints(db.engine)
+        if TEST_ISOLATION == 'transaction':
+            db.create_all()
+        yield app
+        if TEST_ISOLATION == 'transaction':
+            db.drop_all()
+        db.engine.dispose()
+    drop_worker_database(database_url)
 
 
 @pytest.fixture
-def app():
-    """Create and configure a new app instance for each test."""
-    # Create a temporary database file
-    db_fd, db_path = tempfile.mkstemp()
-    
-    # Configure the app for testing with TestingConfig
-    app = create_app(TestingConfig)
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
-    
+def app(session_app):
+    """
+    Provide the app inside an app context. Each test runs inside an outer
+    transaction that is rolled back afterwards; the code under test still
+    commits, but only to a savepoint.
+    """
+    with session_app.app_context():
+        if TEST_ISOLATION != 'transaction':
+            db.create_all()
+            yield session_app
+            db.session.remove()
+            db.drop_all()
+            return
+
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        original_session = db.session
+        # A plain SQLAlchemy Session, because Flask-SQLAlchemy's get_bind
+        # always picks the engine and would ignore the connection.
+        db.session = orm.scoped_session(orm.sessionmaker(
+            bind=connection, query_cls=db.Query,
+            join_transaction_mode='create_savepoint'))
+        try:
+            yield session_app
+        finally:
+            db.session.remove()
+            db.session = original_session
+            transaction.rollback()
+            connection.close()
+
+
+@pytest.fixture
+def concurrent_app(request):
+    """
+    Provide an app whose requests commit for real on separate pooled
+    connections, for race tests that drive it from several threads and for
+    LISTEN/NOTIFY, which only delivers committed notifications. Needs
+    TEST_DATABASE_URL: SQLite serializes writers, so its transactions
+    never interleave and such a test would prove nothing. Config overrides
+    may be passed by indirect parametrization.
+    """
+    if not TEST_DATABASE_URL:
+        pytest.skip("needs TEST_DATABASE_URL for concurrent transactions")
+    database_url = worker_database_url('_concurrent')
+    config = type('ConcurrentTestingConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        **getattr(request, 'param', {})})
+    app = create_app(config)
+
     with app.app_context():
         db.create_all()
         yield app
+        stop_availability()
+        db.session.remove()
         db.drop_all()
-    
-    # Clean up the temporary database file
-    os.close(db_fd)
-    os.unlink(db_path)
+        db.engine.dispose()
+    drop_worker_database(database_url)
 
 
 @pytest.fixture
@@ -42,3 +157,12 @@ def client(app):
 def runner(app):
     """Create a test runner for the app's Click commands."""
     return app.test_cli_runner()
+
+
+@pytest.fixture
+def query_counter():
+    """
+    Return a factory for counting SQL statements, used as
+    `with query_counter() as queries: ...` then `queries.assert_within(n)`.
+    """
+    return QueryCounter
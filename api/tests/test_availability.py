@@ -0,0 +1,169 @@
+"""Tests for the live availability feed."""
+import json
+import time
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+from src.availability import (AvailabilityBroadcaster, broadcaster,
+                              format_event, init_availability)
+from src.models import db, TOTAL_TABLES
+
+NOTIFY_CHANNEL = 'availability_test'
+
+
+def parse_event(chunk):
+    """Decode the JSON data line of an availability event."""
+    text = chunk.decode() if isinstance(chunk, bytes) else chunk
+    assert text.startswith('event: availability\n')
+    data_line = text.split('\n')[1]
+    return json.loads(data_line[len('data: '):])
+
+
+class TestAvailabilityBroadcaster:
+    """Tests for the in-process publisher."""
+
+    def test_publish_fans_out_to_all_subscribers(self):
+        """Test that every subscriber receives a published change."""
+        publisher = AvailabilityBroadcaster()
+        first, second = publisher.subscribe(), publisher.subscribe()
+
+        publisher.publish('2030-05-01T19:00:00', 29)
+
+        assert first.wait(0) == {'2030-05-01T19:00:00': 29}
+        assert second.wait(0) == {'2030-05-01T19:00:00': 29}
+
+    def test_burst_is_coalesced_per_slot(self):
+        """Test that a burst on one slot yields a single latest value."""
+        publisher = AvailabilityBroadcaster()
+        subscription = publisher.subscribe()
+
+        for free_tables in (29, 28, 27):
+            publisher.publish('2030-05-01T19:00:00', free_tables)
+        publisher.publish('2030-05-01T20:00:00', 29)
+
+        assert subscription.wait(0) == {'2030-05-01T19:00:00': 27,
+                                        '2030-05-01T20:00:00': 29}
+        assert subscription.wait(0) == {}
+
+    def test_unsubscribed_clients_receive_nothing(self):
+        """Test that unsubscribing stops delivery."""
+        publisher = AvailabilityBroadcaster()
+        subscription = publisher.subscribe()
+        publisher.unsubscribe(subscription)
+
+        publisher.publish('2030-05-01T19:00:00', 29)
+
+        assert subscription.wait(0) == {}
+        assert publisher.subscriber_count == 0
+
+    def test_format_event(self):
+        """Test the Server-Sent Event framing."""
+        event = format_event({'2030-05-01T19:00:00': 12})
+        assert event.endswith('\n\n')
+        assert parse_event(event) == {
+            'slots': [{'timeSlot': '2030-05-01T19:00:00', 'freeTables': 12}]}
+
+
+class TestAvailabilityStreamEndpoint:
+    """Tests for the availability stream endpoint."""
+
+    def test_stream_headers(self, client):
+        """Test that the endpoint responds with an event stream."""
+        response = client.get('/api/availability/stream')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['Cache-Control'] == 'no-cache'
+        response.close()
+
+    def test_booking_pushes_free_table_count(self, client):
+        """Test that a committed reservation is pushed to stream clients."""
+        response = client.get('/api/availability/stream')
+        stream = iter(response.response)
+        assert next(stream).startswith(b'retry:')
+
+        time_slot = (datetime.now() + timedelta(days=7)).replace(
+            hour=19, minute=0, second=0, microsecond=0)
+        client.post('/api/reservations', json={
+            'customerName': 'John Doe',
+            'emailAddress': 'john@example.com',
+            'numGuests': 2,
+            'timeSlot': time_slot.isoformat()
+        })
+
+        event = parse_event(next(stream))
+        assert event['slots'] == [{'timeSlot': time_slot.isoformat(),
+                                   'freeTables': TOTAL_TABLES - 1}]
+        response.close()
+
+    def test_idle_stream_sends_keep_alive(self, client):
+        """Test that idle streams send heartbeat comments."""
+        response = client.get('/api/availability/stream')
+        stream = iter(response.response)
+        next(stream)
+        assert next(stream).startswith(b':')
+        response.close()
+
+    def test_disconnect_unsubscribes(self, client):
+        """Test that closing the stream releases its subscription."""
+        baseline = broadcaster.subscriber_count
+        response = client.get('/api/availability/stream')
+        stream = iter(response.response)
+        next(stream)
+        assert broadcaster.subscriber_count == baseline + 1
+
+        response.close()
+
+        assert broadcaster.subscriber_count == baseline
+
+
+class TestCrossWorkerAvailability:
+    """Tests for relaying availability through PostgreSQL LISTEN/NOTIFY."""
+
+    def test_invalid_channel_name_is_rejected(self):
+        """Test that the channel name is validated before it reaches SQL."""
+        app = Flask(__name__)
+        app.config.update(
+            SQLALCHEMY_DATABASE_URI='postgresql://localhost/unused',
+            AVAILABILITY_NOTIFY_CHANNEL='availability; DROP TABLE customers')
+        with pytest.raises(ValueError):
+            init_availability(app)
+        assert broadcaster.notify_channel is None
+
+    @pytest.mark.parametrize('concurrent_app', [
+        {'AVAILABILITY_NOTIFY_CHANNEL': NOTIFY_CHANNEL}], indirect=True)
+    def test_booking_reaches_stream_through_listen(self, concurrent_app):
+        """Test that a committed booking is announced with NOTIFY and
+        relayed to stream clients by the listener thread."""
+        assert broadcaster.notify_channel == NOTIFY_CHANNEL
+        deadline = time.monotonic() + 10
+        while not db.session.scalar(db.text(
+                "SELECT count(*) FROM pg_stat_activity "
+                "WHERE datname = current_database() AND query = :listen"),
+                {'listen': f"LISTEN {NOTIFY_CHANNEL}"}):
+            assert time.monotonic() < deadline, "listener never subscribed"
+            time.sleep(0.05)
+        db.session.rollback()
+
+        client = concurrent_app.test_client()
+        response = client.get('/api/availability/stream')
+        stream = iter(response.response)
+        assert next(stream).startswith(b'retry:')
+
+        time_slot = datetime(2030, 5, 1, 19, 0)
+        assert client.post('/api/reservations', json={
+            'customerName': 'John Doe',
+            'emailAddress': 'john@example.com',
+            'numGuests': 2,
+            'timeSlot': time_slot.isoformat()
+        }).status_code == 201
+
+        # Events only arrive through LISTEN: with a channel configured,
+        # announce_slot does not publish in-process.
+        chunk = next(stream)
+        while chunk.startswith(b':'):
+            assert time.monotonic() < deadline, "no event was relayed"
+            chunk = next(stream)
+        assert parse_event(chunk)['slots'] == [{
+            'timeSlot': time_slot.isoformat(),
+            'freeTables': TOTAL_TABLES - 1}]
+        response.close()
@@ -0,0 +1,171 @@
+"""Tests for the bulk historical import command."""
+import json
+from datetime import datetime
+from src.models import db, Customer, Reservation, TOTAL_TABLES
+
+
+def write_customers_csv(path, rows):
+    lines = ['customer_name,email_address,phone_number,newsletter_signup']
+    lines += [','.join(row) for row in rows]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def write_ndjson(path, records):
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+    return str(path)
+
+
+class TestImportHistoryCommand:
+    """Tests for the import-history CLI command."""
+
+    def test_imports_customers_and_dedupes_by_email(self, app, runner, tmp_path):
+        """Test that customers are loaded once per email address."""
+        db.session.add(Customer(customer_name='Existing',
+                                email_address='existing@example.com'))
+        db.session.commit()
+        customers = write_customers_csv(tmp_path / 'customers.csv', [
+            ('Ann Lee', 'ann@example.com', '555-0001', 'true'),
+            ('Ann Again', 'ann@example.com', '', 'false'),
+            ('Bo Park', 'bo@example.com', '', 'no'),
+            ('Existing Renamed', 'existing@example.com', '', 'yes'),
+        ])
+
+        result = runner.invoke(args=['import-history', '--customers',
+                                     customers, '--batch-size', '2'])
+
+        assert result.exit_code == 0, result.output
+        assert 'customers: 4 rows read, 2 inserted, 2 duplicates' in result.output
+        assert 'rows/sec' in result.output
+        ann = Customer.query.filter_by(email_address='ann@example.com').one()
+        assert ann.customer_name == 'Ann Lee'
+        assert ann.newsletter_signup is True
+        assert Customer.query.filter_by(
+            email_address='bo@example.com').one().phone_number is None
+        assert Customer.query.filter_by(
+            email_address='existing@example.com').one().customer_name == 'Existing'
+
+    def test_imports_reservations_and_reports_conflicts(self, app, runner,
+                                                        tmp_path):
+        """Test FK resolution and that conflicts do not abort the load."""
+        customers = write_ndjson(tmp_path / 'customers.ndjson', [
+            {'customer_name': 'Ann Lee', 'email_address': 'ann@example.com'},
+            {'customer_name': 'Bo Park', 'email_address': 'bo@example.com'},
+        ])
+        reservations = write_ndjson(tmp_path / 'reservations.ndjson', [
+            {'email_address': 'ann@example.com',
+             'time_slot': '2024-01-05T19:00:00', 'table_number': 1},
+            {'email_address': 'bo@example.com',
+             'time_slot': '2024-01-05T19:00:00', 'table_number': 1},
+            {'email_address': 'bo@example.com',
+             'time_slot': '2024-01-05T19:00:00Z', 'table_number': 2},
+            {'email_address': 'ghost@example.com',
+             'time_slot': '2024-01-05T20:00:00', 'table_number': 3},
+            {'email_address': 'ann@example.com',
+             'time_slot': 'not a date', 'table_number': 4},
+            {'email_address': 'ann@example.com',
+             'time_slot': '2024-01-05T19:00:00', 'table_number': 2},
+        ])
+        conflicts_path = tmp_path / 'conflicts.ndjson'
+
+        result = runner.invoke(args=[
+            'import-history', '--customers', customers,
+            '--reservations', reservations, '--batch-size', '2',
+            '--conflicts-out', str(conflicts_path)])
+
+        assert result.exit_code == 0, result.output
+        assert ('reservations: 6 rows read, 2 inserted, 0 duplicates skipped, '
+                '4 conflicts') in result.output
+
+        booked = {(r.customer.email_address, r.table_number)
+                  for r in Reservation.query.all()}
+        assert booked == {('ann@example.com', 1), ('bo@example.com', 2)}
+        assert Reservation.query.filter_by(table_number=2).one().time_slot == \
+            datetime(2024, 1, 5, 19, 0)
+
+        conflicts = [json.loads(line)
+                     for line in conflicts_path.read_text().splitlines()]
+        assert [(c['line'], c['reason'].split(':')[0]) for c in conflicts] == [
+            (2, '_time_slot_table_uc'),
+            (4, 'unknown customer'),
+            (5, 'invalid row'),
+            (6, '_time_slot_table_uc'),
+        ]
+
+    def test_reports_malformed_lines_and_out_of_range_tables(self, app, runner,
+                                                             tmp_path):
+        """Test that bad JSON and unknown tables are invalid rows, not errors."""
+        db.session.add(Customer(customer_name='Ann Lee',
+                                email_address='ann@example.com'))
+        db.session.commit()
+        reservations = tmp_path / 'reservations.ndjson'
+        reservations.write_text('\n'.join([
+            json.dumps({'email_address': 'ann@example.com',
+                        'time_slot': '2024-01-05T19:00:00', 'table_number': 1}),
+            '{"email_address": "ann@example.com", "time_slot": ',
+            '["not", "an", "object"]',
+            json.dumps({'email_address': 'ann@example.com',
+                        'time_slot': '2024-01-05T19:00:00', 'table_number': 0}),
+            json.dumps({'email_address': 'ann@example.com',
+                        'time_slot': '2024-01-05T19:00:00',
+                        'table_number': TOTAL_TABLES + 1}),
+            json.dumps({'email_address': 'ann@example.com',
+                        'time_slot': '2024-01-05T19:00:00',
+                        'table_number': TOTAL_TABLES}),
+        ]) + '\n')
+        conflicts_path = tmp_path / 'conflicts.ndjson'
+
+        result = runner.invoke(args=[
+            'import-history', '--reservations', str(reservations),
+            '--conflicts-out', str(conflicts_path)])
+
+        assert result.exit_code == 0, result.output
+        assert ('reservations: 6 rows read, 2 inserted, 0 duplicates skipped, '
+                '4 conflicts') in result.output
+        assert {r.table_number for r in Reservation.query.all()} == {
+            1, TOTAL_TABLES}
+        conflicts = [json.loads(line)
+                     for line in conflicts_path.read_text().splitlines()]
+        assert [c['line'] for c in conflicts] == [2, 3, 4, 5]
+        assert all(c['reason'].startswith('invalid row: ') for c in conflicts)
+
+    def test_reports_non_string_and_overlong_values(self, app, runner,
+                                                    tmp_path):
+        """Test that wrongly typed or too long fields are invalid rows and
+        the rest of the batch is still loaded."""
+        customers = write_ndjson(tmp_path / 'customers.ndjson', [
+            {'customer_name': 'Ann Lee', 'email_address': 'ann@example.com'},
+            {'customer_name': 5, 'email_address': 'five@example.com'},
+            {'customer_name': 'Seven', 'email_address': 7},
+            {'customer_name': 'x' * 256, 'email_address': 'long@example.com'},
+            {'customer_name': 'Bo Park', 'email_address': 'bo@example.com',
+             'phone_number': '5' * 51},
+            {'customer_name': 'Cy Ng', 'email_address': 'cy@example.com',
+             'phone_number': '555-0003'},
+        ])
+        reservations = write_ndjson(tmp_path / 'reservations.ndjson', [
+            {'email_address': 7, 'time_slot': '2024-01-05T19:00:00',
+             'table_number': 1},
+            {'email_address': 'ann@example.com',
+             'time_slot': '2024-01-05T19:00:00', 'table_number': 2},
+        ])
+
+        result = runner.invoke(args=[
+            'import-history', '--customers', customers,
+            '--reservations', reservations])
+
+        assert result.exit_code == 0, result.output
+        assert ('customers: 6 rows read, 2 inserted, 0 duplicates skipped, '
+                '4 conflicts') in result.output
+        assert ('reservations: 2 rows read, 1 inserted, 0 duplicates skipped, '
+                '1 conflicts') in result.output
+        assert {c.email_address for c in Customer.query.all()} == {
+            'ann@example.com', 'cy@example.com'}
+        assert 'invalid row: email_address must be a string' in result.output
+        assert 'invalid row: phone_number is longer than 50' in result.output
+
+    def test_requires_an_input_file(self, runner):
+        """Test that the command refuses to run without input files."""
+        result = runner.invoke(args=['import-history'])
+        assert result.exit_code != 0
+        assert 'Pass --customers and/or --reservations' in result.output
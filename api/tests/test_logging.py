@@ -0,0 +1,225 @@
+"""Tests for structured request logging."""
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import textwrap
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler
+import pytest
+from src import logging_config, routes
+from src.logging_config import JsonFormatter, PACKAGE_LOGGER
+from src.models import db, Customer, Reservation
+
+
+@pytest.fixture
+def log_lines(monkeypatch):
+    """
+    Redirect the log listener to a buffer; the returned function drains the
+    queue and returns the JSON records written so far.
+    """
+    buffer = io.StringIO()
+    output = logging.StreamHandler(buffer)
+    output.setFormatter(JsonFormatter())
+    listener = logging_config._listener
+    monkeypatch.setattr(listener, 'handlers', (output,))
+
+    def read():
+        listener.stop()  # Processes everything queued so far
+        listener.start()
+        return [json.loads(line) for line in buffer.getvalue().splitlines()]
+
+    yield read
+    listener.stop()
+    listener.start()
+
+
+class TestJsonFormatter:
+    """Tests for the JSON log formatter."""
+
+    def test_formats_context_fields(self):
+        """Test that request context extras become JSON fields."""
+        record = logging.LogRecord('src.test', logging.INFO, __file__, 1,
+                                   'hello %s', ('world',), None)
+        record.request_id = 'abc'
+        record.latency_ms = 1.5
+
+        entry = json.loads(JsonFormatter().format(record))
+
+        assert entry['message'] == 'hello world'
+        assert entry['level'] == 'INFO'
+        assert entry['request_id'] == 'abc'
+        assert entry['latency_ms'] == 1.5
+        assert 'status' not in entry
+
+
+class TestRequestLogging:
+    """Tests for per-request structured log records."""
+
+    def test_package_logs_go_through_a_queue(self, app):
+        """Test that request threads only ever enqueue records."""
+        handlers = [handler for handler
+                    in logging.getLogger(PACKAGE_LOGGER).handlers
+                    if not type(handler).__module__.startswith('_pytest')]
+        assert handlers
+        assert all(isinstance(handler, QueueHandler) for handler in handlers)
+
+    def test_listener_is_an_os_thread_under_gevent(self):
+        """Test that the listener drains the queue while the gevent hub is
+        blocked, as it is in a gunicorn gevent worker."""
+        pytest.importorskip('gevent')
+        script = textwrap.dedent('''
+            from gevent import monkey
+            monkey.patch_all()
+            import io, logging, sys, time
+            sys.path.insert(0, sys.argv[1])
+            from src.logging_config import start_structured_logging
+
+            buffer = io.StringIO()
+            start_structured_logging(buffer)
+            logging.getLogger('src.gevent_test').warning('from a greenlet')
+            # A native sleep never yields to the hub, so only an OS thread
+            # can write the record in the meantime
+            native_sleep = monkey.get_original('time', 'sleep')
+            deadline = time.monotonic() + 5
+            while not buffer.getvalue() and time.monotonic() < deadline:
+                native_sleep(0.01)
+            sys.stdout.write(buffer.getvalue())
+        ''')
+        api_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+        result = subprocess.run([sys.executable, '-c', script, api_root],
+                                capture_output=True, text=True, timeout=30)
+
+        assert result.returncode == 0, result.stderr
+        assert json.loads(result.stdout)['message'] == 'from a greenlet'
+
+    def test_request_record_fields(self, client, log_lines):
+        """Test the record emitted for a completed request."""
+        response = client.get('/api/reservations',
+                              headers={'X-Request-ID': 'req-123'})
+
+        assert response.headers['X-Request-ID'] == 'req-123'
+        [entry] = [e for e in log_lines() if e['message'] == 'request completed']
+        assert entry['request_id'] == 'req-123'
+        assert entry['route'] == '/api/reservations'
+        assert entry['method'] == 'GET'
+        assert entry['status'] == 200
+        assert entry['db_queries'] == 1
+        assert entry['latency_ms'] >= entry['db_time_ms'] >= 0
+
+    def test_generates_request_ids(self, client, log_lines):
+        """Test that requests without an ID get a unique one."""
+        first = client.get('/api/health').headers['X-Request-ID']
+        second = client.get('/api/health').headers['X-Request-ID']
+        assert first and second and first != second
+
+    def test_client_request_ids_are_capped(self, client, log_lines):
+        """Test that an oversized client request ID is truncated."""
+        request_id = 'x' * (logging_config.REQUEST_ID_MAX_LENGTH + 1000)
+        response = client.get('/api/health',
+                              headers={'X-Request-ID': request_id})
+
+        capped = request_id[:logging_config.REQUEST_ID_MAX_LENGTH]
+        assert response.headers['X-Request-ID'] == capped
+        assert [e['request_id'] for e in log_lines()
+                if e['message'] == 'request completed'] == [capped]
+
+    def test_request_id_is_allowed_and_exposed_by_cors(self, client):
+        """Test that the browser UI may send and read the request ID."""
+        origin = 'http://localhost:3000'
+        preflight = client.options('/api/reservations', headers={
+            'Origin': origin,
+            'Access-Control-Request-Method': 'GET',
+            'Access-Control-Request-Headers': 'X-Request-ID'})
+        allowed = preflight.headers['Access-Control-Allow-Headers'].lower()
+        assert 'x-request-id' in allowed
+
+        response = client.get('/api/health', headers={'Origin': origin})
+        exposed = response.headers['Access-Control-Expose-Headers'].lower()
+        for header in ('x-request-id', 'x-query-count', 'x-query-time-ms'):
+            assert header in exposed
+
+    def test_handler_errors_carry_request_context(self, app, client,
+                                                  log_lines, monkeypatch):
+        """Test that errors logged by a view share the request's ID."""
+        customer = Customer(customer_name='Log Test',
+                            email_address='log@example.com')
+        db.session.add(customer)
+        db.session.flush()
+        db.session.add(Reservation(customer_id=customer.customer_id,
+                                   time_slot=datetime(2030, 5, 1, 19, 0),
+                                   table_number=1))
+        db.session.commit()
+
+        def fail(*args):
+            raise RuntimeError('boom')
+        monkeypatch.setattr(routes, 'serialize_reservation', fail)
+
+        response = client.get('/api/reservations',
+                              headers={'X-Request-ID': 'req-err'})
+
+        assert response.status_code == 500
+        entries = [e for e in log_lines() if e['request_id'] == 'req-err']
+        error = next(e for e in entries if e['level'] == 'ERROR')
+        assert error['message'] == 'Error fetching reservations'
+        assert error['route'] == '/api/reservations'
+        assert 'RuntimeError: boom' in error['exception']
+
+    def test_successes_are_sampled_but_errors_are_not(self, app, client,
+                                                      log_lines, monkeypatch):
+        """Test that a zero sample rate drops successes only."""
+        monkeypatch.setitem(app.config, 'LOG_SUCCESS_SAMPLE_RATE', 0.0)
+
+        client.get('/api/health')
+        client.get('/api/reservations/99999')
+
+        statuses = [e['status'] for e in log_lines()
+                    if e['message'] == 'request completed']
+        assert statuses == [404]
+
+
+@pytest.mark.slow
+class TestLoggingOverhead:
+    """Benchmark of the per-request cost of structured logging."""
+
+    ROUNDS = 5
+    REQUESTS = 200
+
+    def time_requests(self, client):
+        """Best-of-rounds mean latency of a health check, in seconds."""
+        timings = []
+        for _ in range(self.ROUNDS):
+            start = time.perf_counter()
+            for _ in range(self.REQUESTS):
+                client.get('/api/health')
+            timings.append((time.perf_counter() - start) / self.REQUESTS)
+        return min(timings)
+
+    def test_per_request_overhead(self, app, client, log_lines, monkeypatch):
+        """Report the added latency of request logging. Timings vary too much
+        between machines to assert on; run with -m slow -s to see them."""
+        baseline_app = type(app)(app.import_name)
+        baseline_app.register_blueprint(routes.api_bp, url_prefix='/api')
+        baseline_client = baseline_app.test_client()
+        self.time_requests(client)  # Warm up
+
+        baseline = self.time_requests(baseline_client)
+        monkeypatch.setitem(app.config, 'LOG_SUCCESS_SAMPLE_RATE', 0.0)
+        sampled_out = self.time_requests(client)
+        monkeypatch.setitem(app.config, 'LOG_SUCCESS_SAMPLE_RATE', 1.0)
+        logged = self.time_requests(client)
+
+        start = time.perf_counter()
+        for _ in range(self.REQUESTS):
+            logging_config.request_logger.info(
+                "request completed", extra={"status": 200})
+        enqueue = (time.perf_counter() - start) / self.REQUESTS
+
+        print(f"\nper request: no logging hooks {baseline * 1e6:.0f}us, "
+              f"sampled out {sampled_out * 1e6:.0f}us, "
+              f"logged {logged * 1e6:.0f}us; "
+              f"one enqueued record {enqueue * 1e6:.0f}us")
@@ -1,6 +1,8 @@
 """Tests for database models."""
 from datetime import datetime, timedelta
-from src.models import Customer, Reservation
+import pytest
+from sqlalchemy.exc import IntegrityError
+from src.models import db, Customer, Reservation
 
 
 class TestCustomerModel:
@@ -137,3 +139,32 @@ class TestReservationModel:
             # Test back-reference
             assert reservation1.customer == customer
             assert reservation2.customer == customer
+
+    def test_cancelled_reservation_frees_its_table(self, app):
+        """Test that the unique slot/table index ignores cancelled rows."""
+        customer = Customer(customer_name='Index Test',
+                            email_address='index@example.com')
+        db.session.add(customer)
+        db.session.commit()
+        time_slot = datetime.now() + timedelta(days=2)
+
+        first = Reservation(customer_id=customer.customer_id,
+                            time_slot=time_slot, table_number=7)
+        db.session.add(first)
+        db.session.commit()
+
+        db.session.add(Reservation(customer_id=customer.customer_id,
+                                   time_slot=time_slot, table_number=7))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+        first.cancelled_at = datetime.now()
+        db.session.commit()
+        rebooked = Reservation(customer_id=customer.customer_id,
+                               time_slot=time_slot, table_number=7)
+        db.session.add(rebooked)
+        db.session.commit()
+
+        assert first.is_cancelled
+        assert not rebooked.is_cancelled
@@ -0,0 +1,91 @@
+"""Tests for the SQL query counting harness."""
+import pytest
+from sqlalchemy.exc import IntegrityError
+from src.app import create_app
+from src.config import TestingConfig
+from src.models import db, Customer
+from src.querycount import QueryCounter
+
+
+class TestQueryCounter:
+    """Tests for the QueryCounter context manager."""
+
+    def test_counts_statements_and_time(self, app):
+        """Test that statements inside the block are recorded."""
+        with QueryCounter() as queries:
+            Customer.query.all()
+            Customer.query.filter_by(email_address='a@example.com').first()
+
+        assert queries.count == 2
+        assert all(s.startswith('SELECT') for s in queries.statements)
+        assert queries.duration >= 0
+
+    def test_stops_counting_after_exit(self, app):
+        """Test that statements after the block are not recorded."""
+        with QueryCounter() as queries:
+            Customer.query.all()
+        Customer.query.all()
+
+        assert queries.count == 1
+
+    def test_nested_counters(self, app):
+        """Test that nested counters each see the statements in scope."""
+        with QueryCounter() as outer:
+            Customer.query.all()
+            with QueryCounter() as inner:
+                Customer.query.all()
+
+        assert outer.count == 2
+        assert inner.count == 1
+
+    def test_assert_within_reports_statements(self, app):
+        """Test that budget failures list the offending statements."""
+        with QueryCounter() as queries:
+            Customer.query.all()
+
+        with pytest.raises(AssertionError, match='FROM customers'):
+            queries.assert_within(0)
+
+    def test_failed_statements_are_counted(self, app):
+        """Test that a statement that raises is counted and timed."""
+        db.session.add(Customer(customer_name='Ann',
+                                email_address='ann@example.com'))
+        db.session.commit()
+
+        with QueryCounter() as queries:
+            with pytest.raises(IntegrityError):
+                db.session.add(Customer(customer_name='Ann Again',
+                                        email_address='ann@example.com'))
+                db.session.flush()
+            db.session.rollback()
+
+        assert [s.split()[0] for s in queries.statements] == ['INSERT']
+        assert queries.duration > 0
+
+
+class TestQueryCountHeader:
+    """Tests for the opt-in per-request query count headers."""
+
+    def test_headers_absent_by_default(self, client):
+        """Test that the debug headers are off unless enabled."""
+        response = client.get('/api/reservations')
+        assert 'X-Query-Count' not in response.headers
+
+    def test_headers_report_queries_per_request(self):
+        """Test that enabled headers report each request separately."""
+        class HeaderConfig(TestingConfig):
+            QUERY_COUNT_HEADER = True
+
+        app = create_app(HeaderConfig)
+        client = app.test_client()
+        with app.app_context():
+            db.create_all()
+            try:
+                health = client.get('/api/health')
+                listing = client.get('/api/reservations')
+            finally:
+                db.drop_all()
+
+        assert health.headers['X-Query-Count'] == '0'
+        assert listing.headers['X-Query-Count'] == '1'
+        assert float(listing.headers['X-Query-Time-Ms']) >= 0
@@ -1,7 +1,31 @@
 """Tests for API routes."""
 import pytest
 import json
+import threading
 from datetime import datetime, timedelta
+from src import routes
+from src.models import db, Customer, Reservation, TOTAL_TABLES
+from src.routes import build_reservation_search_query
+
+
+def explain_plan(query):
+    """Return the query plan lines for an ORM query on the active engine."""
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect,
+                                      compile_kwargs={"literal_binds": True}))
+    if dialect.name == 'postgresql':
+        # Tiny test tables always favour a sequential scan; disable it so
+        # the plan shows whether an index is usable at all.
+        db.session.execute(db.text("SET LOCAL enable_seqscan = off"))
+        rows = db.session.execute(db.text(f"EXPLAIN {sql}"))
+        return [row[0] for row in rows]
+    rows = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}"))
+    return [row[-1] for row in rows]
+
+
+def is_full_scan(plan_line):
+    """Whether a plan line reads a whole table instead of an index range."""
+    return plan_line.startswith('SCAN') or 'Seq Scan' in plan_line
 
 
 class TestHealthEndpoint:
@@ -179,6 +203,356 @@ class TestReservationEndpoint:
         assert response.status_code == 404
 
 
+class TestReservationSearchEndpoint:
+    """Tests for the reservation search endpoint."""
+
+    @pytest.fixture
+    def seeded(self, app):
+        """Seed a few customers with reservations on two evenings."""
+        evening = datetime(2030, 5, 1, 19, 0)
+        people = [('Smith, John', 'john@example.com'),
+                  ('Smithers, Jane', 'jane@example.com'),
+                  ('Bob Jones', 'bob@example.com')]
+        for index, (name, email) in enumerate(people):
+            customer = Customer(customer_name=name, email_address=email)
+            db.session.add(customer)
+            db.session.flush()
+            for day in range(2):
+                db.session.add(Reservation(
+                    customer_id=customer.customer_id,
+                    time_slot=evening + timedelta(days=day),
+                    table_number=index + 1))
+        db.session.commit()
+        return evening
+
+    def test_search_by_email(self, client, seeded):
+        """Test exact email filtering."""
+        response = client.get('/api/reservations/search?email=bob@example.com')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert len(data['reservations']) == 2
+        assert {r['customerName'] for r in data['reservations']} == {'Bob Jones'}
+
+    def test_search_by_name_prefix_is_case_insensitive(self, client, seeded):
+        """Test customer name prefix filtering."""
+        response = client.get('/api/reservations/search?name=smi')
+        data = json.loads(response.data)
+        names = {r['customerName'] for r in data['reservations']}
+        assert names == {'Smith, John', 'Smithers, Jane'}
+
+    def test_search_name_prefix_treats_wildcards_literally(self, client, seeded):
+        """Test that LIKE wildcards in the prefix are not expanded."""
+        response = client.get('/api/reservations/search?name=s%25')
+        data = json.loads(response.data)
+        assert data['reservations'] == []
+
+    @pytest.mark.parametrize('name, prefix', [
+        ('Mary Ann', 'mary '),
+        ("O'Brien, Pat", "o'b"),
+        ('Émile Zola', 'é'),
+        ('émile Zola', 'É'),
+    ])
+    def test_search_name_prefix_with_punctuation_and_accents(
+            self, client, seeded, name, prefix):
+        """Test prefixes with spaces, apostrophes and non-ASCII letters."""
+        customer = Customer(customer_name=name, email_address='x@example.com')
+        db.session.add(customer)
+        db.session.flush()
+        db.session.add(Reservation(customer_id=customer.customer_id,
+                                   time_slot=seeded, table_number=10))
+        db.session.commit()
+
+        response = client.get('/api/reservations/search',
+                              query_string={'name': prefix})
+        data = json.loads(response.data)
+        assert [r['customerName'] for r in data['reservations']] == [name]
+
+    @pytest.mark.parametrize('prefix', ['a\U0010ffff', 'a\ud7ff', '\uffff'])
+    def test_search_name_prefix_at_code_point_edges(self, client, seeded,
+                                                   prefix):
+        """Test prefixes whose last character has no simple successor."""
+        response = client.get('/api/reservations/search',
+                              query_string={'name': prefix})
+        assert response.status_code == 200
+        assert json.loads(response.data)['reservations'] == []
+
+    def test_search_by_time_range(self, client, seeded):
+        """Test half-open time slot range filtering."""
+        start = seeded.isoformat()
+        end = (seeded + timedelta(days=1)).isoformat()
+        response = client.get(
+            f'/api/reservations/search?name=smith&from={start}&to={end}')
+        data = json.loads(response.data)
+        assert len(data['reservations']) == 2
+        assert all(r['timeSlot'] == start for r in data['reservations'])
+
+    def test_search_pagination(self, client, seeded):
+        """Test that results are paginated in time slot order."""
+        first = json.loads(client.get(
+            '/api/reservations/search?from=2030-01-01&perPage=4').data)
+        second = json.loads(client.get(
+            '/api/reservations/search?from=2030-01-01&perPage=4&page=2').data)
+        assert len(first['reservations']) == 4
+        assert first['hasMore'] is True
+        assert len(second['reservations']) == 2
+        assert second['hasMore'] is False
+        slots = [r['timeSlot'] for r in
+                 first['reservations'] + second['reservations']]
+        assert slots == sorted(slots)
+
+    def test_search_invalid_parameters(self, client):
+        """Test validation of range and pagination parameters."""
+        assert client.get(
+            '/api/reservations/search?from=yesterday').status_code == 400
+        assert client.get(
+            '/api/reservations/search?name=smi&page=0').status_code == 400
+        assert client.get('/api/reservations/search').status_code == 400
+
+    @pytest.mark.parametrize('filters', [
+        {},
+        {'email_address': 'john@example.com'},
+        {'name_prefix': 'smi'},
+        {'start': datetime(2030, 5, 1), 'end': datetime(2030, 5, 2)},
+        {'email_address': 'john@example.com', 'name_prefix': 'smi'},
+        {'email_address': 'john@example.com', 'start': datetime(2030, 5, 1)},
+        {'name_prefix': 'smi', 'start': datetime(2030, 5, 1),
+         'end': datetime(2030, 5, 2)},
+        {'email_address': 'john@example.com', 'name_prefix': 'smi',
+         'start': datetime(2030, 5, 1), 'end': datetime(2030, 5, 2)},
+    ])
+    def test_search_query_plan_uses_indexes(self, app, filters):
+        """Test that every filter combination avoids full table scans, and
+        that an unfiltered search, which could not, is refused."""
+        if not filters:
+            with pytest.raises(ValueError):
+                build_reservation_search_query()
+            return
+        plan = explain_plan(build_reservation_search_query(**filters))
+        assert plan
+        assert not [line for line in plan if is_full_scan(line)], plan
+
+
+def book_table(client, email, time_slot):
+    """POST a reservation and return the response."""
+    return client.post('/api/reservations', json={
+        'customerName': 'Guest',
+        'emailAddress': email,
+        'numGuests': 2,
+        'timeSlot': time_slot.isoformat()
+    })
+
+
+def fill_slot(time_slot, tables=TOTAL_TABLES):
+    """Book `tables` tables at a time slot directly in the database."""
+    customer = Customer(customer_name='Walk In',
+                        email_address='walkin@example.com')
+    db.session.add(customer)
+    db.session.flush()
+    reservations = [Reservation(customer_id=customer.customer_id,
+                                time_slot=time_slot, table_number=table)
+                    for table in range(1, tables + 1)]
+    db.session.add_all(reservations)
+    db.session.commit()
+    return reservations
+
+
+class TestCancelReservationEndpoint:
+    """Tests for cancelling reservations."""
+
+    SLOT = datetime(2030, 5, 1, 19, 0)
+
+    def test_cancel_is_soft(self, app, client):
+        """Test that cancelling keeps the row and flags it."""
+        reservation = fill_slot(self.SLOT, tables=1)[0]
+
+        response = client.delete(f'/api/reservations/{reservation.reservation_id}')
+
+        assert response.status_code == 200
+        data = json.loads(client.get(
+            f'/api/reservations/{reservation.reservation_id}').data)
+        assert data['cancelled'] is True
+        # Stamped from the app clock, like the naive time slots around it
+        cancelled_at = db.session.get(Reservation,
+                                      reservation.reservation_id).cancelled_at
+        assert abs(cancelled_at - datetime.now()) < timedelta(minutes=1)
+
+    def test_cancel_is_idempotent(self, app, client):
+        """Test that cancelling twice succeeds."""
+        reservation = fill_slot(self.SLOT, tables=1)[0]
+        url = f'/api/reservations/{reservation.reservation_id}'
+        assert client.delete(url).status_code == 200
+        assert client.delete(url).status_code == 200
+
+    def test_cancel_nonexistent_reservation(self, client):
+        """Test cancelling a reservation that does not exist."""
+        assert client.delete('/api/reservations/99999').status_code == 404
+
+    def test_cancelled_table_returns_to_the_pool(self, app, client):
+        """Test that a full slot accepts a booking after a cancellation."""
+        reservations = fill_slot(self.SLOT)
+        assert book_table(client, 'late@example.com', self.SLOT).status_code == 409
+
+        freed = reservations[4]
+        client.delete(f'/api/reservations/{freed.reservation_id}')
+        response = book_table(client, 'late@example.com', self.SLOT)
+
+        assert response.status_code == 201
+        data = json.loads(response.data)
+        assert data['reservationDetails']['tableNumber'] == freed.table_number
+
+    def test_cancelled_reservations_are_not_searched(self, app, client):
+        """Test that search only returns active bookings."""
+        reservation = fill_slot(self.SLOT, tables=1)[0]
+        client.delete(f'/api/reservations/{reservation.reservation_id}')
+
+        data = json.loads(client.get(
+            '/api/reservations/search?email=walkin@example.com').data)
+        assert data['reservations'] == []
+
+
+class TestModifyReservationEndpoint:
+    """Tests for moving reservations to another time slot."""
+
+    SLOT = datetime(2030, 5, 1, 19, 0)
+
+    def test_move_updates_in_place(self, app, client, query_counter):
+        """Test that a move reassigns the same row without re-inserting."""
+        reservation = fill_slot(self.SLOT, tables=1)[0]
+        new_slot = self.SLOT + timedelta(hours=1)
+
+        with query_counter() as queries:
+            response = client.put(
+                f'/api/reservations/{reservation.reservation_id}',
+                json={'timeSlot': new_slot.isoformat()})
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['reservationId'] == reservation.reservation_id
+        assert data['timeSlot'] == new_slot.isoformat()
+        assert not [s for s in queries.statements
+                    if s.startswith(('INSERT', 'DELETE'))]
+        assert Reservation.query.count() == 1
+
+    def test_move_to_full_slot_conflicts(self, app, client):
+        """Test that moving into a fully booked slot is rejected."""
+        full_slot = self.SLOT + timedelta(hours=1)
+        fill_slot(full_slot)
+        customer = Customer(customer_name='Mover',
+                            email_address='mover@example.com')
+        db.session.add(customer)
+        db.session.flush()
+        reservation = Reservation(customer_id=customer.customer_id,
+                                  time_slot=self.SLOT, table_number=1)
+        db.session.add(reservation)
+        db.session.commit()
+
+        response = client.put(f'/api/reservations/{reservation.reservation_id}',
+                              json={'timeSlot': full_slot.isoformat()})
+
+        assert response.status_code == 409
+        assert db.session.get(Reservation,
+                              reservation.reservation_id).time_slot == self.SLOT
+
+    def test_move_cancelled_reservation_is_not_found(self, app, client):
+        """Test that cancelled reservations cannot be moved."""
+        reservation = fill_slot(self.SLOT, tables=1)[0]
+        url = f'/api/reservations/{reservation.reservation_id}'
+        client.delete(url)
+
+        response = client.put(url, json={
+            'timeSlot': (self.SLOT + timedelta(hours=1)).isoformat()})
+
+        assert response.status_code == 404
+
+    def test_move_invalid_payload(self, app, client):
+        """Test validation of the move request."""
+        reservation = fill_slot(self.SLOT, tables=1)[0]
+        url = f'/api/reservations/{reservation.reservation_id}'
+        assert client.put(url, json={}).status_code == 400
+        assert client.put(url, json={'timeSlot': 'soon'}).status_code == 400
+
+
+class TestReservationRaces:
+    """
+    Tests for concurrent booking, moving and cancelling. The stale-read test
+    forces the losing interleaving deterministically and is the race
+    coverage that always runs; the threaded test is a smoke test on a real
+    PostgreSQL database and is skipped without TEST_DATABASE_URL.
+    """
+
+    SLOT = datetime(2030, 5, 1, 19, 0)
+
+    def test_booking_retries_after_losing_a_table(self, app, client,
+                                                  monkeypatch):
+        """Test that a booking which loses its table to a concurrent
+        booking retries with another table instead of failing."""
+        fill_slot(self.SLOT, tables=1)
+        # The first read misses the booking of table 1 made concurrently
+        stale_reads = [set()]
+        real_lookup = routes.get_booked_tables_for_slot
+        monkeypatch.setattr(
+            routes, 'get_booked_tables_for_slot',
+            lambda slot: stale_reads.pop() if stale_reads else real_lookup(slot))
+        monkeypatch.setattr(routes, 'find_available_table_number',
+                            lambda booked: min(set(range(1, TOTAL_TABLES + 1))
+                                               - booked, default=None))
+
+        response = book_table(client, 'racer@example.com', self.SLOT)
+
+        assert response.status_code == 201
+        data = json.loads(response.data)
+        assert data['reservationDetails']['tableNumber'] == 2
+
+    def test_cancel_while_booking_full_slot(self, concurrent_app):
+        """Smoke test: bookings racing cancellations on a full slot never
+        double book a table and every freed table is reusable."""
+        with concurrent_app.app_context():
+            reservations = fill_slot(self.SLOT)
+            cancel_ids = [r.reservation_id for r in reservations[:5]]
+
+        barrier = threading.Barrier(len(cancel_ids) * 2)
+        statuses = []
+
+        def cancel(reservation_id):
+            barrier.wait()
+            response = concurrent_app.test_client().delete(
+                f'/api/reservations/{reservation_id}')
+            statuses.append(('cancel', response.status_code))
+
+        def book(index):
+            barrier.wait()
+            response = book_table(concurrent_app.test_client(),
+                                  f'racer{index}@example.com', self.SLOT)
+            statuses.append(('book', response.status_code))
+
+        threads = [threading.Thread(target=cancel, args=(reservation_id,))
+                   for reservation_id in cancel_ids]
+        threads += [threading.Thread(target=book, args=(index,))
+                    for index in range(len(cancel_ids))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert set(statuses) <= {('book', 201), ('book', 409),
+                                 ('cancel', 200)}
+        with concurrent_app.app_context():
+            active = Reservation.query.filter_by(
+                time_slot=self.SLOT, cancelled_at=None).all()
+            tables = [r.table_number for r in active]
+            assert len(tables) == len(set(tables))
+            booked = statuses.count(('book', 201))
+            assert len(active) == TOTAL_TABLES - len(cancel_ids) + booked
+
+            # Whatever the interleaving, every freed table can be rebooked
+            client = concurrent_app.test_client()
+            for index in range(TOTAL_TABLES - len(active)):
+                assert book_table(client, f'late{index}@example.com',
+                                  self.SLOT).status_code == 201
+            assert book_table(client, 'last@example.com',
+                              self.SLOT).status_code == 409
+
+
 class TestNewsletterEndpoint:
     """Tests for the newsletter subscription endpoint."""
 
@@ -224,6 +598,118 @@ class TestNewsletterEndpoint:
         assert response.status_code == 400
 
 
+class TestQueryBudgets:
+    """Tests bounding the SQL statements and DB time spent per endpoint."""
+
+    # Generous wall-clock ceiling for the statements of a single request
+    MAX_DB_SECONDS = 0.5
+
+    def book(self, client, email, time_slot):
+        return client.post('/api/reservations', json={
+            'customerName': 'Budget Test',
+            'emailAddress': email,
+            'numGuests': 2,
+            'timeSlot': time_slot.isoformat()
+        })
+
+    def seed_reservations(self, count):
+        evening = datetime(2030, 5, 1, 19, 0)
+        reservations = []
+        for index in range(count):
+            customer = Customer(customer_name=f'Guest {index}',
+                                email_address=f'guest{index}@example.com')
+            db.session.add(customer)
+            db.session.flush()
+            reservations.append(Reservation(
+                customer_id=customer.customer_id,
+                time_slot=evening + timedelta(hours=index), table_number=1))
+        db.session.add_all(reservations)
+        db.session.commit()
+        return reservations
+
+    def test_health_issues_no_queries(self, client, query_counter):
+        """Test that the health check does not touch the database."""
+        with query_counter() as queries:
+            client.get('/api/health')
+        queries.assert_within(0)
+
+    def test_create_reservation_budget(self, client, query_counter):
+        """Test the statement budget for new and returning customers."""
+        slot = datetime(2030, 5, 1, 19, 0)
+        with query_counter() as queries:
+            assert self.book(client, 'new@example.com', slot).status_code == 201
+        queries.assert_within(6, self.MAX_DB_SECONDS)
+
+        with query_counter() as queries:
+            assert self.book(client, 'new@example.com',
+                             slot + timedelta(hours=1)).status_code == 201
+        queries.assert_within(4, self.MAX_DB_SECONDS)
+
+    def test_newsletter_budget(self, client, query_counter):
+        """Test the statement budget for newsletter signups."""
+        with query_counter() as queries:
+            client.post('/api/newsletter', json={'email': 'news@example.com'})
+        queries.assert_within(2, self.MAX_DB_SECONDS)
+
+    def test_get_reservation_by_id_budget(self, app, client, query_counter):
+        """Test that fetching one reservation is a single join query."""
+        reservation_id = self.seed_reservations(1)[0].reservation_id
+        with query_counter() as queries:
+            assert client.get(
+                f'/api/reservations/{reservation_id}').status_code == 200
+        queries.assert_within(1, self.MAX_DB_SECONDS)
+
+    def test_search_budget(self, app, client, query_counter):
+        """Test that a filtered search is a single join query."""
+        self.seed_reservations(3)
+        with query_counter() as queries:
+            response = client.get('/api/reservations/search?name=guest'
+                                  '&from=2030-05-01T19:00:00&perPage=2')
+        assert len(json.loads(response.data)['reservations']) == 2
+        queries.assert_within(1, self.MAX_DB_SECONDS)
+
+    def test_modify_reservation_budget(self, app, client, query_counter):
+        """Test the statement budget for moving a reservation."""
+        reservation = self.seed_reservations(1)[0]
+        new_slot = reservation.time_slot + timedelta(days=1)
+        with query_counter() as queries:
+            response = client.put(
+                f'/api/reservations/{reservation.reservation_id}',
+                json={'timeSlot': new_slot.isoformat()})
+        assert response.status_code == 200
+        # Locked read, slot check, update, a free-table count for both
+        # slots, then reloading the row and its customer for the response
+        queries.assert_within(7, self.MAX_DB_SECONDS)
+
+    def test_cancel_reservation_budget(self, app, client, query_counter):
+        """Test the statement budget for cancelling a reservation."""
+        reservation_id = self.seed_reservations(1)[0].reservation_id
+        with query_counter() as queries:
+            response = client.delete(f'/api/reservations/{reservation_id}')
+        assert response.status_code == 200
+        # Locked read, update, reload after commit, free-table count
+        queries.assert_within(4, self.MAX_DB_SECONDS)
+
+    @pytest.mark.parametrize('url', [
+        '/api/reservations',
+        '/api/reservations/search?name=guest',
+    ])
+    def test_listing_query_count_is_constant(self, app, client,
+                                             query_counter, url):
+        """Test that listing N reservations does not issue N+1 queries."""
+        counts = []
+        for total in (1, 10):
+            db.session.query(Reservation).delete()
+            db.session.query(Customer).delete()
+            self.seed_reservations(total)
+            with query_counter() as queries:
+                response = client.get(url)
+            assert len(json.loads(response.data)['reservations']) == total
+            queries.assert_within(1, self.MAX_DB_SECONDS)
+            counts.append(queries.count)
+        assert counts[0] == counts[1]
+
+
 class TestAPIErrorHandling:
     """Tests for API error handling."""
 